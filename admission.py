@@ -0,0 +1,313 @@
+"""
+Admission control in front of LLM-backed work.
+
+Every Gemini / Hugging Face call goes through an AdmissionController:
+- priority classes: INTERACTIVE is always dispatched before BULK, and BULK may
+  only use part of the concurrency so interactive requests keep headroom
+- per-tenant (institute) fair queuing: round-robin between tenants inside a class
+- bounded queues: a full queue or an expired wait sheds the request with
+  Overloaded, which the routers turn into 429 + Retry-After
+- bounded batch requests: a bulk request holds a worker thread for its whole
+  run, so only a few may run at once and the threadpool stays free for
+  interactive traffic
+- identical in-flight requests are coalesced into one call (a request never
+  waits behind a lower-priority identical call)
+"""
+import copy
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from enum import IntEnum
+
+from fastapi import HTTPException
+
+from metrics import Counter, Gauge, Histogram, record_cache
+
+# -------- CONFIG --------
+DEFAULT_TENANT = "default"
+
+QUEUE_DEPTH = Gauge(
+    "sih_admission_queue_depth",
+    "Requests waiting for an LLM slot",
+    labels=("controller", "priority"),
+)
+RUNNING = Gauge(
+    "sih_admission_running",
+    "Requests holding an LLM slot",
+    labels=("controller", "priority"),
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "sih_admission_wait_seconds",
+    "Time spent queued before admission",
+    labels=("controller", "priority"),
+)
+SHED = Counter(
+    "sih_admission_shed_total",
+    "Requests rejected with 429 (reason is queue_full, timeout or too_many_batches)",
+    labels=("controller", "priority", "reason"),
+)
+COALESCED = Counter(
+    "sih_admission_coalesced_total",
+    "Requests answered by an identical in-flight request",
+    labels=("controller",),
+)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BULK = 1
+
+
+# Sync endpoints run on FastAPI's worker threadpool (40 threads by default) and a
+# queued ticket blocks its thread, so queue bounds and running batch requests
+# stay well below that; bulk items give up quickly instead of pinning a thread.
+MAX_QUEUE = {Priority.INTERACTIVE: 16, Priority.BULK: 8}
+MAX_WAIT = {Priority.INTERACTIVE: 15.0, Priority.BULK: 10.0}
+MAX_BULK_REQUESTS = 4
+
+
+class Overloaded(Exception):
+    def __init__(self, controller: str, priority: Priority, reason: str, retry_after: int):
+        super().__init__(f"{controller} is overloaded ({priority.name.lower()} {reason}), retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def overloaded_http_exception(error: Overloaded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+def request_key(*parts) -> str:
+    """Stable key for coalescing identical requests"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class _Ticket:
+    __slots__ = ("priority", "tenant", "event", "granted")
+
+    def __init__(self, priority, tenant):
+        self.priority = priority
+        self.tenant = tenant
+        self.event = threading.Event()
+        self.granted = False
+
+
+class _InFlight:
+    __slots__ = ("priority", "event", "result", "error")
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# -------- CONTROLLER --------
+class AdmissionController:
+    def __init__(self, name: str, max_concurrent: int = 8, max_bulk_concurrent: int = None,
+                 max_queue=None, max_wait=None, max_bulk_requests: int = MAX_BULK_REQUESTS):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.limits = {
+            Priority.INTERACTIVE: max_concurrent,
+            # Keep at least one slot free for interactive traffic
+            Priority.BULK: max_bulk_concurrent or max(1, max_concurrent // 2),
+        }
+        self.max_queue = max_queue or dict(MAX_QUEUE)
+        self.max_wait = max_wait or dict(MAX_WAIT)
+        self.max_bulk_requests = max_bulk_requests
+
+        self._lock = threading.Lock()
+        # priority -> tenant -> deque of tickets; tenant order is the round-robin order
+        self._queues = {p: OrderedDict() for p in Priority}
+        self._queued = {p: 0 for p in Priority}
+        self._running = {p: 0 for p in Priority}
+        # Coalesced followers also hold a worker thread while they wait
+        self._followers = {p: 0 for p in Priority}
+        self._bulk_requests = 0
+        self._inflight = {}
+        self._service_time = 1.0  # EWMA of seconds per call, used for Retry-After
+
+    # ---- bookkeeping (lock held) ----
+    def _queue_full(self, priority) -> bool:
+        return self._queued[priority] + self._followers[priority] >= self.max_queue[priority]
+
+    def _can_run(self, priority) -> bool:
+        return (
+            sum(self._running.values()) < self.max_concurrent
+            and self._running[priority] < self.limits[priority]
+        )
+
+    def _publish(self):
+        for p in Priority:
+            labels = {"controller": self.name, "priority": p.name.lower()}
+            QUEUE_DEPTH.set(self._queued[p] + self._followers[p], **labels)
+            RUNNING.set(self._running[p], **labels)
+
+    def _dispatch(self):
+        for priority in Priority:
+            queues = self._queues[priority]
+            while queues and self._can_run(priority):
+                tenant, tickets = next(iter(queues.items()))
+                ticket = tickets.popleft()
+                # Served tenant moves to the back of the round-robin
+                del queues[tenant]
+                if tickets:
+                    queues[tenant] = tickets
+
+                self._queued[priority] -= 1
+                self._running[priority] += 1
+                ticket.granted = True
+                ticket.event.set()
+        self._publish()
+
+    def _retry_after(self, priority) -> int:
+        backlog = self._queued[priority] + 1
+        return max(1, min(60, math.ceil(backlog * self._service_time / self.limits[priority])))
+
+    def _shed(self, priority, reason):
+        SHED.inc(controller=self.name, priority=priority.name.lower(), reason=reason)
+        return Overloaded(self.name, priority, reason, self._retry_after(priority))
+
+    # ---- admission ----
+    def check_capacity(self, priority: Priority):
+        """Fail fast before starting work that will need to queue (e.g. a whole batch)"""
+        with self._lock:
+            if priority == Priority.BULK and self._bulk_requests >= self.max_bulk_requests:
+                raise self._shed(priority, "too_many_batches")
+            if self._queue_full(priority):
+                raise self._shed(priority, "queue_full")
+
+    @contextmanager
+    def bulk_request(self):
+        """
+        Hold one of max_bulk_requests batch slots for a whole batch request,
+        or raise Overloaded right away when they are all taken.
+        """
+        with self._lock:
+            if self._bulk_requests >= self.max_bulk_requests:
+                raise self._shed(Priority.BULK, "too_many_batches")
+            self._bulk_requests += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._bulk_requests -= 1
+
+    def _acquire(self, priority: Priority, tenant: str):
+        start = time.perf_counter()
+        with self._lock:
+            if self._queue_full(priority):
+                raise self._shed(priority, "queue_full")
+
+            ticket = _Ticket(priority, tenant)
+            self._queues[priority].setdefault(tenant, deque()).append(ticket)
+            self._queued[priority] += 1
+            self._dispatch()
+
+        if not ticket.event.wait(self.max_wait[priority]):
+            with self._lock:
+                if not ticket.granted:
+                    tickets = self._queues[priority][tenant]
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self._queues[priority][tenant]
+                    self._queued[priority] -= 1
+                    self._publish()
+                    raise self._shed(priority, "timeout")
+
+        QUEUE_WAIT_SECONDS.observe(
+            time.perf_counter() - start, controller=self.name, priority=priority.name.lower()
+        )
+
+    def _release(self, priority: Priority, service_time: float):
+        with self._lock:
+            self._running[priority] -= 1
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+            self._dispatch()
+
+    def _run_admitted(self, fn, priority, tenant):
+        self._acquire(priority, tenant)
+        start = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self._release(priority, time.perf_counter() - start)
+
+    def run(self, fn, priority: Priority = Priority.INTERACTIVE, tenant: str = None, key: str = None):
+        """
+        Run fn once a slot is free for (priority, tenant). Calls sharing a key
+        while one of them is in flight get a copy of that call's result, unless
+        the in-flight call has a lower priority: then this call runs on its own
+        and becomes the one later duplicates join.
+        Raises Overloaded when the request is shed.
+        """
+        tenant = tenant or DEFAULT_TENANT
+        if key is None:
+            return self._run_admitted(fn, priority, tenant)
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None or call.priority > priority
+            if leader:
+                call = self._inflight[key] = _InFlight(priority)
+            elif self._queue_full(priority):
+                raise self._shed(priority, "queue_full")
+            else:
+                self._followers[priority] += 1
+                self._publish()
+
+        # Coalescing is a cache of in-flight results: joining one is a hit
+        record_cache(f"{self.name}_inflight", not leader)
+        if not leader:
+            COALESCED.inc(controller=self.name)
+            try:
+                finished = call.event.wait(self.max_wait[priority])
+            finally:
+                with self._lock:
+                    self._followers[priority] -= 1
+                    self._publish()
+            if not finished:
+                with self._lock:
+                    raise self._shed(priority, "timeout")
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = self._run_admitted(fn, priority, tenant)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+            call.event.set()
+
+        # Callers may mutate results (e.g. add student_id), so nobody shares the original
+        return copy.deepcopy(call.result)
+
+
+# -------- SHARED CONTROLLERS (one per provider quota) --------
+gemini_admission = AdmissionController(
+    "gemini",
+    max_concurrent=int(os.getenv("GEMINI_MAX_CONCURRENT", "8")),
+    max_bulk_concurrent=int(os.getenv("GEMINI_MAX_BULK_CONCURRENT", "4")),
+    max_bulk_requests=int(os.getenv("GEMINI_MAX_BATCH_REQUESTS", str(MAX_BULK_REQUESTS))),
+)
+huggingface_admission = AdmissionController(
+    "huggingface",
+    max_concurrent=int(os.getenv("HF_MAX_CONCURRENT", "4")),
+    max_bulk_concurrent=int(os.getenv("HF_MAX_BULK_CONCURRENT", "2")),
+    max_bulk_requests=int(os.getenv("HF_MAX_BATCH_REQUESTS", str(MAX_BULK_REQUESTS))),
+)
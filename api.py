@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from typing import Optional
 from rag import get_rag_answer, build_vectorstore, load_txt_documents
+from metrics import track_request, render_prometheus
+from admission import Overloaded, Priority, gemini_admission, overloaded_http_exception, request_key
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 import os
@@ -51,16 +55,23 @@ def get_vectorstore():
 
 
 @router.post("/rag", response_model=RAGResponse)
-def rag_endpoint(request: RAGRequest):
+def rag_endpoint(request: RAGRequest, x_institute_id: Optional[str] = Header(default=None)):
     """
     RAG endpoint to answer questions based on knowledge base
     """
     try:
-        # Get vectorstore
-        vs = get_vectorstore()
-
-        # FIXED: get_rag_answer returns 3 values: docs, combined, final_answer
-        docs, combined, final_answer = get_rag_answer(vs, request.query, k=request.k)
+        with track_request("/rag"):
+            # Get vectorstore
+            vs = get_vectorstore()
+
+            # FIXED: get_rag_answer returns 3 values: docs, combined, final_answer
+            # Identical in-flight questions share one Gemini call
+            docs, combined, final_answer = gemini_admission.run(
+                lambda: get_rag_answer(vs, request.query, k=request.k),
+                priority=Priority.INTERACTIVE,
+                tenant=x_institute_id,
+                key=request_key("rag", request.query, request.k),
+            )
 
         # Extract source information
         sources = [
@@ -79,6 +90,8 @@ def rag_endpoint(request: RAGRequest):
             sources=sources
         )
 
+    except Overloaded as e:
+        raise overloaded_http_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing RAG query: {str(e)}")
 
@@ -88,6 +101,15 @@ def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "vectorstore_loaded": vectorstore is not None}
 
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics (per-stage latency, tokens, cache hits, in-flight requests)"""
+    return PlainTextResponse(
+        render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
 # from fastapi import APIRouter
 # from pydantic import BaseModel
 #
@@ -1,11 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Dict, List
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, Field, create_model
+from typing import Dict, List, Optional
+import pandas as pd
 
+from admission import Overloaded, Priority, gemini_admission, overloaded_http_exception, request_key
 from dropout_model import analyze_student_dropout_risk, analyze_batch_students
+from explain import explain_batch, rank_interventions
+from features import FEATURE_COLUMNS, load_student_features
+from metrics import track_request
+from populate import engine
+from train import MODEL_PATH, load_trained_model
 
 router = APIRouter()
 
+# Trained XGBoost model (loaded on first use)
+risk_model = None
+
 
 # -----------------------------
 # Request Schemas
@@ -18,29 +29,127 @@ class BatchStudentRequest(BaseModel):
     form_responses: List[Dict]
 
 
+# One raw feature row: every FEATURE_COLUMNS value as a finite number, optional
+# student_id, nothing else (misspelled columns are rejected with 422)
+FeatureRow = create_model(
+    "FeatureRow",
+    __config__=ConfigDict(extra="forbid", allow_inf_nan=False),
+    student_id=(Optional[str], None),
+    **{column: (float, ...) for column in FEATURE_COLUMNS},
+)
+
+
+class ExplainBatchRequest(BaseModel):
+    student_ids: Optional[List[str]] = None
+    # Alternatively, raw feature rows
+    features: Optional[List[FeatureRow]] = None
+    top_k: int = Field(3, ge=1, le=len(FEATURE_COLUMNS))
+
+
+def get_risk_model():
+    """Load the trained model once"""
+    global risk_model
+
+    if risk_model is None:
+        risk_model, _ = load_trained_model(MODEL_PATH)
+
+    return risk_model
+
+
 # -----------------------------
 # API ENDPOINTS
 # -----------------------------
 
+def _admitted_analysis(priority: Priority, tenant: str):
+    """analyze_student_dropout_risk behind the Gemini admission controller"""
+    def analyze(form_response: dict) -> dict:
+        return gemini_admission.run(
+            lambda: analyze_student_dropout_risk(form_response),
+            priority=priority,
+            tenant=tenant,
+            key=request_key("analyze", form_response),
+        )
+
+    return analyze
+
+
 @router.post("/analyze")
-def analyze_single_student(request: SingleStudentRequest):
+def analyze_single_student(request: SingleStudentRequest,
+                           x_institute_id: Optional[str] = Header(default=None)):
     """
-    Analyze dropout risk for one student.
+    Analyze dropout risk for one student (interactive priority).
     """
     try:
-        result = analyze_student_dropout_risk(request.form_response)
+        with track_request("/analyze"):
+            result = _admitted_analysis(Priority.INTERACTIVE, x_institute_id)(request.form_response)
         return result
+    except Overloaded as e:
+        raise overloaded_http_exception(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/analyze-batch")
-def analyze_multiple_students(request: BatchStudentRequest):
+def analyze_multiple_students(request: BatchStudentRequest,
+                              x_institute_id: Optional[str] = Header(default=None)):
     """
-    Analyze dropout risk for multiple students.
+    Analyze dropout risk for multiple students (bulk priority, admitted per student
+    so interactive requests can go in between). Only a few batches run at once.
+    If the batch is shed part-way, finished analyses are still returned and the
+    remaining students are marked shed, with Retry-After on the response.
     """
     try:
-        results = analyze_batch_students(request.form_responses)
+        gemini_admission.check_capacity(Priority.BULK)
+        with gemini_admission.bulk_request(), track_request("/analyze-batch"):
+            results = analyze_batch_students(
+                request.form_responses,
+                analyze_fn=_admitted_analysis(Priority.BULK, x_institute_id),
+            )
+
+        retry_after = [r["retry_after"] for r in results if r.get("shed")]
+        if retry_after:
+            return JSONResponse(content=results, headers={"Retry-After": str(max(retry_after))})
         return results
+    except Overloaded as e:
+        raise overloaded_http_exception(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/explain-batch")
+def explain_multiple_students(request: ExplainBatchRequest):
+    """
+    Per-feature risk drivers for many students from the trained model
+    (no LLM call), plus interventions ranked across the whole batch.
+    """
+    if not request.student_ids and not request.features:
+        raise HTTPException(status_code=422, detail="Provide student_ids or features")
+
+    try:
+        with track_request("/explain-batch"):
+            model = get_risk_model()
+
+            not_found = []
+            if request.features:
+                features = pd.DataFrame(
+                    [row.model_dump(exclude={"student_id"}) for row in request.features],
+                    index=pd.Index(
+                        [row.student_id or f"student_{i + 1}" for i, row in enumerate(request.features)],
+                        name="student_id",
+                    ),
+                )[FEATURE_COLUMNS]
+            else:
+                with engine.connect() as conn:
+                    features = load_student_features(conn, request.student_ids)
+                # Unknown ids (or students without progress rows) have nothing to explain
+                not_found = [sid for sid in request.student_ids if sid not in features.index]
+
+            explanations = explain_batch(model, features, top_k=request.top_k)
+
+        return {
+            "students": explanations,
+            "ranked_interventions": rank_interventions(explanations),
+            "not_found": not_found,
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+
+from metrics import track_request
+from populate import engine
+from reporting import ROLLUP_SCOPES, get_rollups, iter_csv, refresh_rollups
+
+router = APIRouter()
+
+
+# -----------------------------
+# Request Schemas
+# -----------------------------
+class RefreshRequest(BaseModel):
+    # Only re-aggregate these classes; all classes when omitted
+    class_ids: Optional[List[str]] = None
+
+
+# -----------------------------
+# API ENDPOINTS
+# -----------------------------
+
+@router.get("/reports/rollups/{scope}")
+def rollups(scope: str):
+    """
+    Marks, attendance, payment and rf aggregates per class, mentor or institute.
+    """
+    if scope not in ROLLUP_SCOPES:
+        raise HTTPException(status_code=404, detail=f"Unknown scope {scope!r}, expected one of {ROLLUP_SCOPES}")
+
+    try:
+        with track_request("/reports/rollups"):
+            with engine.connect() as conn:
+                return get_rollups(conn, scope)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/reports/rollups/refresh")
+def refresh(request: RefreshRequest):
+    """
+    Incrementally refresh the rollup tables.
+    """
+    try:
+        with track_request("/reports/rollups/refresh"):
+            return refresh_rollups(engine, class_ids=request.class_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/reports/export/student-progress.csv")
+def export_student_progress():
+    """
+    Stream every student progress row as CSV (constant memory on the server).
+    """
+    return StreamingResponse(
+        iter_csv(engine),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=student_progress.csv"},
+    )
@@ -0,0 +1,498 @@
+"""
+Offline end-to-end benchmarks.
+
+Every LLM and the embedding model are replaced with deterministic fakes, and a
+synthetic university.db is generated, so numbers only reflect our own code
+(serialization, parsing, retrieval, SQL, ORM) and can be compared between commits.
+
+    python bench.py run --out bench_results.json
+    python bench.py compare baseline.json bench_results.json --threshold 0.10
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+# -------- CONFIG --------
+DEFAULT_THRESHOLD = 0.10  # 10% slower / less throughput counts as a regression
+
+FORM_QUESTIONS = [
+    "How often do you feel stressed, overwhelmed, or mentally exhausted?",
+    "Do distractions (social media, gaming, phone usage, social group) affect your routine?",
+    "How clear are you about your career direction?",
+    "Do you handle responsibilities at home that reduce study time (household work, siblings, famly business)?",
+    "How often do you feel lost or behind in classes?",
+    "How motivated do you feel to attend classes regularly?",
+    "How confident are you in your ability to pass all subjects this semester?",
+    "What is the biggest difficulty affecting your ability to continue smoothly in college?",
+    "If you ever thought about dropping out or taking a break, what was the main reason?",
+]
+FORM_ANSWERS = ["Never", "Rarely", "Sometimes", "Often", "Very often", "Regularly", "No clarity at all"]
+
+FAKE_ANALYSIS = {
+    "dropout_probability": 0.77,
+    "risk_level": "High",
+    "psychological_reasons": [
+        f"{FORM_QUESTIONS[0]} -> 'Very often' indicates high stress",
+        f"{FORM_QUESTIONS[2]} -> 'No clarity at all' indicates poor goal clarity",
+    ],
+    "student_strengths": ["No major academic gaps indicated"],
+    "recommended_interventions": ["Immediate counselling for stress", "Career guidance sessions"],
+}
+
+NL2SQL_QUESTIONS = [
+    "Which 10 students have the lowest average marks?",
+    "What is the average attendance per class?",
+    "How many students have unpaid fees?",
+]
+# Scripted ReAct turns for the fake SQL agent: one real query, then a final answer
+NL2SQL_SCRIPT = [
+    "Thought: I should query the progress table.\n"
+    "Action: sql_db_query\n"
+    "Action Input: SELECT s.name, AVG(p.marks) AS avg_marks FROM students s "
+    "JOIN student_progress p ON p.student_id = s.id GROUP BY s.id ORDER BY avg_marks LIMIT 10",
+    "Thought: I now know the final answer.\nFinal Answer: done",
+]
+
+
+# -------- FAKES --------
+def fake_form_response(rng):
+    form = {q: rng.choice(FORM_ANSWERS) for q in FORM_QUESTIONS}
+    form["student_id"] = f"STU{rng.randint(1, 99999):05d}"
+    return form
+
+
+class FakeGemini:
+    """Stands in for google.generativeai.GenerativeModel"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def generate_content(self, prompt):
+        if self.latency:
+            time.sleep(self.latency)
+        text = "Students can contact the counselling cell for support."
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def fake_chat_model(latency: float = 0.0):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    return FakeListChatModel(responses=[json.dumps(FAKE_ANALYSIS)], sleep=latency or None)
+
+
+def fake_embeddings():
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    # Same dimension as all-MiniLM-L6-v2
+    return DeterministicFakeEmbedding(size=384)
+
+
+def synthetic_documents(n_docs: int, rng):
+    from faker import Faker
+    from langchain_core.documents import Document
+
+    fake = Faker()
+    Faker.seed(rng.randint(0, 10**6))
+    return [
+        Document(
+            page_content=fake.paragraph(nb_sentences=12),
+            metadata={"source": f"policy_{i}.txt", "doc_id": f"policy_{i}"},
+        )
+        for i in range(n_docs)
+    ]
+
+
+# -------- TIMING HELPERS --------
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    # Nearest-rank percentile
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def latency_summary(samples):
+    """Latency samples (seconds) -> p50/p99/mean in milliseconds"""
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+    }
+
+
+def _llm_calls(pipeline):
+    from metrics import LLM_CALLS
+
+    return LLM_CALLS.total(pipeline=pipeline)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+# -------- BENCHMARKS --------
+def bench_populate(cfg):
+    from faker import Faker
+
+    import populate
+
+    # populate.fake shares Faker's class-level random; seed it so the DB is reproducible
+    Faker.seed(cfg.seed)
+    session = populate.Session()
+    elapsed, counts = timed(
+        populate.populate,
+        session,
+        n_institutes=cfg.institutes,
+        n_admins=cfg.institutes,
+        n_mentors=cfg.institutes * 2,
+        n_classes=cfg.classes,
+        subjects_per_class=cfg.subjects_per_class,
+        n_students=cfg.students,
+    )
+    session.close()
+
+    rows = sum(counts.values())
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1),
+    }
+
+
+def bench_analyze(cfg, rng):
+    import dropout_model
+    import api_dropout
+
+    dropout_model.llm = fake_chat_model(cfg.llm_latency)
+    calls_before = _llm_calls("analyze")
+
+    samples = []
+    for _ in range(cfg.requests):
+        request = api_dropout.SingleStudentRequest(form_response=fake_form_response(rng))
+        elapsed, _ = timed(api_dropout.analyze_single_student, request, x_institute_id=None)
+        samples.append(elapsed)
+
+    result = latency_summary(samples)
+    result["requests_per_s"] = round(len(samples) / sum(samples), 1)
+    # Calls beyond one per analysis (refetches, cache fallbacks)
+    result["wasted_llm_calls_per_analysis"] = round(
+        (_llm_calls("analyze") - calls_before - len(samples)) / len(samples), 3
+    )
+    # Per-call prompt token accounting from the prompt compiler (informational)
+    result["prompt_tokens"] = dropout_model.compiler.compile(fake_form_response(rng)).report()
+
+    # Same prompt with a cached prefix and the benchmark questions as the fixed question set
+    from prompt_compiler import PromptCompiler, QuestionMap
+
+    cached = PromptCompiler(
+        static_messages=dropout_model.compiler.static_messages,
+        user_template=dropout_model.USER_PROMPT_TEMPLATE,
+        pipeline="bench_cached",
+        question_map=QuestionMap(FORM_QUESTIONS),
+        baseline_builder=dropout_model._baseline_prompt_text,
+    )
+    cached.set_prefix_cache_hook(lambda prefix_messages: "bench-cached-prefix")
+    result["prompt_tokens_cached_prefix"] = cached.compile(fake_form_response(rng)).report()
+    return result
+
+
+def bench_analyze_batch(cfg, rng):
+    import api_dropout
+
+    # dropout_model.llm is already faked by bench_analyze
+    forms = [fake_form_response(rng) for _ in range(cfg.batch_size)]
+    request = api_dropout.BatchStudentRequest(form_responses=forms)
+
+    samples = []
+    for _ in range(cfg.batches):
+        elapsed, _ = timed(api_dropout.analyze_multiple_students, request, x_institute_id=None)
+        samples.append(elapsed)
+
+    result = latency_summary(samples)
+    result["students_per_s"] = round(cfg.batch_size * len(samples) / sum(samples), 1)
+    return result
+
+
+def bench_mixed_load(cfg, rng):
+    """Interactive /analyze latency alone vs. while bulk /analyze-batch jobs run"""
+    import threading
+
+    import dropout_model
+    import api_dropout
+
+    # Admission control only matters once LLM calls take time
+    original_llm = dropout_model.llm
+    dropout_model.llm = fake_chat_model(max(cfg.llm_latency, 0.02))
+
+    def interactive_samples():
+        samples = []
+        for _ in range(cfg.mixed_requests):
+            request = api_dropout.SingleStudentRequest(form_response=fake_form_response(rng))
+            elapsed, _ = timed(api_dropout.analyze_single_student, request, x_institute_id="interactive")
+            samples.append(elapsed)
+        return samples
+
+    idle = interactive_samples()
+
+    stop = threading.Event()
+
+    from fastapi import HTTPException
+
+    def bulk_worker(tenant):
+        forms = [fake_form_response(random.Random(tenant)) for _ in range(cfg.batch_size)]
+        request = api_dropout.BatchStudentRequest(form_responses=forms)
+        while not stop.is_set():
+            try:
+                response = api_dropout.analyze_multiple_students(request, x_institute_id=tenant)
+            except HTTPException as e:
+                if e.status_code != 429:
+                    raise
+                response = e
+            # Shed (429, or partly shed with Retry-After); back off like a client would
+            if "Retry-After" in (getattr(response, "headers", None) or {}):
+                time.sleep(0.05)
+
+    workers = [
+        threading.Thread(target=bulk_worker, args=(f"bulk_{i}",), daemon=True)
+        for i in range(cfg.bulk_workers)
+    ]
+    for w in workers:
+        w.start()
+    time.sleep(0.2)
+    loaded = interactive_samples()
+    stop.set()
+    for w in workers:
+        w.join()
+
+    dropout_model.llm = original_llm
+    return {"idle": latency_summary(idle), "under_bulk_load": latency_summary(loaded)}
+
+
+def bench_rag(cfg, rng):
+    import api
+    import rag
+
+    rag.GEMINI_MODEL = FakeGemini(cfg.llm_latency)
+    embeddings = fake_embeddings()
+    queries = [
+        "What benefits can a highly depressed student avail?",
+        "How do I apply for a fee waiver?",
+        "Who should I contact for mentoring?",
+    ]
+
+    # Untimed warm-up: the first build also pays Chroma's one-time client start-up
+    rag.build_vectorstore(
+        synthetic_documents(2, random.Random(cfg.seed)),
+        embeddings=embeddings,
+        collection_name="bench_kb_warmup",
+        persist_directory=None,
+    )
+
+    ingest, retrieval = {}, {}
+    for kb_size in cfg.kb_sizes:
+        docs = synthetic_documents(kb_size, rng)
+        elapsed, vs = timed(
+            rag.build_vectorstore,
+            docs,
+            embeddings=embeddings,
+            collection_name=f"bench_kb_{kb_size}_{rng.randint(0, 10**6)}",
+            persist_directory=None,
+        )
+        ingest[f"kb_{kb_size}"] = {
+            "seconds": round(elapsed, 3),
+            "docs_per_s": round(kb_size / elapsed, 1),
+        }
+
+        api.vectorstore = vs
+        for k in cfg.k_values:
+            samples = []
+            for i in range(cfg.requests):
+                request = api.RAGRequest(query=queries[i % len(queries)], k=k)
+                elapsed, _ = timed(api.rag_endpoint, request, x_institute_id=None)
+                samples.append(elapsed)
+            retrieval[f"kb_{kb_size}_k_{k}"] = latency_summary(samples)
+
+    return ingest, retrieval
+
+
+def bench_nl2sql(cfg):
+    from langchain.agents import create_sql_agent
+    from langchain.agents.agent_toolkits import SQLDatabaseToolkit
+    from langchain_community.utilities import SQLDatabase
+    from langchain_core.language_models.fake import FakeListLLM
+
+    import n2sql
+    import populate
+
+    llm = FakeListLLM(responses=NL2SQL_SCRIPT)
+    toolkit = SQLDatabaseToolkit(db=SQLDatabase(populate.engine), llm=llm)
+    n2sql.agent = create_sql_agent(llm=llm, toolkit=toolkit, verbose=False, handle_parsing_errors=True)
+
+    samples = []
+    for i in range(cfg.requests):
+        elapsed, _ = timed(n2sql.ask_agent, NL2SQL_QUESTIONS[i % len(NL2SQL_QUESTIONS)])
+        samples.append(elapsed)
+
+    return latency_summary(samples)
+
+
+# -------- RUN / COMPARE --------
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+            # The repo's commit, wherever the benchmark is started from
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(cfg):
+    rng = random.Random(cfg.seed)
+    random.seed(cfg.seed)
+
+    workdir = tempfile.mkdtemp(prefix="sih-bench-")
+    # Must be set before populate (and n2sql, which imports its engine) is imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'university.db')}"
+    print(f"Synthetic database: {os.environ['DATABASE_URL']}")
+
+    results = {}
+    print("Benchmarking DB population...")
+    results["populate"] = bench_populate(cfg)
+
+    print("Benchmarking /analyze...")
+    results["analyze"] = bench_analyze(cfg, rng)
+
+    print("Benchmarking /analyze-batch...")
+    results["analyze_batch"] = bench_analyze_batch(cfg, rng)
+
+    print("Benchmarking interactive latency under bulk load...")
+    results["mixed_load"] = bench_mixed_load(cfg, rng)
+
+    print("Benchmarking KB ingestion and /rag...")
+    results["kb_ingest"], results["rag"] = bench_rag(cfg, rng)
+
+    print("Benchmarking NL->SQL...")
+    results["nl2sql"] = bench_nl2sql(cfg)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(cfg),
+        },
+        "results": results,
+    }
+
+
+def _flatten(tree, prefix=""):
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD):
+    """
+    Compare two result files. Metrics ending in _ms or seconds are lower-is-better,
+    metrics ending in _per_s are higher-is-better; everything else is informational.
+    Returns a list of regression dicts.
+    """
+    old = _flatten(baseline["results"])
+    new = _flatten(current["results"])
+
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name], new[name]
+        if not before:
+            continue
+
+        if name.endswith("_ms") or name.endswith("seconds"):
+            change = (after - before) / before
+        elif name.endswith("_per_s"):
+            change = (before - after) / before
+        else:
+            continue
+
+        if change > threshold:
+            regressions.append({"metric": name, "baseline": before, "current": after, "worse_by": round(change, 3)})
+
+    return regressions
+
+
+def _parse_int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the SIH dropout system")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="Run all benchmarks and write JSON results")
+    run_p.add_argument("--out", default="bench_results.json")
+    run_p.add_argument("--seed", type=int, default=42)
+    run_p.add_argument("--institutes", type=int, default=20)
+    run_p.add_argument("--classes", type=int, default=50)
+    run_p.add_argument("--subjects-per-class", type=int, default=8)
+    run_p.add_argument("--students", type=int, default=2000)
+    run_p.add_argument("--requests", type=int, default=200, help="Requests per latency benchmark")
+    run_p.add_argument("--batch-size", type=int, default=50)
+    run_p.add_argument("--batches", type=int, default=5)
+    run_p.add_argument("--bulk-workers", type=int, default=4, help="Concurrent batch clients in mixed_load")
+    run_p.add_argument("--mixed-requests", type=int, default=50, help="Interactive requests per mixed_load phase")
+    run_p.add_argument("--kb-sizes", type=_parse_int_list, default=[50, 500, 2000])
+    run_p.add_argument("--k-values", type=_parse_int_list, default=[1, 3, 10])
+    run_p.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per fake LLM call")
+
+    cmp_p = sub.add_parser("compare", help="Compare two result files and flag regressions")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run(args)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = compare(baseline, current, args.threshold)
+    print(f"Baseline {baseline['meta']['commit']} vs current {current['meta']['commit']} "
+          f"(threshold {args.threshold:.0%})")
+    if not regressions:
+        print("No regressions.")
+        return 0
+
+    for r in regressions:
+        print(f"  REGRESSION {r['metric']}: {r['baseline']} -> {r['current']} ({r['worse_by']:+.1%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, String, Integer, Boolean, ForeignKey, Enum, create_engine
+    Column, String, Integer, Boolean, Float, DateTime, ForeignKey, Enum, create_engine
 )
 from sqlalchemy.orm import relationship, declarative_base
 import enum
@@ -100,6 +100,7 @@ class Student(Base):
     class_ = relationship("Class", back_populates="students")
 
     progress = relationship("StudentProgress", back_populates="student")
+    risk = relationship("StudentRisk", back_populates="student", uselist=False)
 
 
 class Subject(Base):
@@ -131,3 +132,42 @@ class StudentProgress(Base):
 
     student = relationship("Student", back_populates="progress")
     subject = relationship("Subject", back_populates="progress")
+
+
+class StudentRisk(Base):
+    """Latest precomputed dropout risk per student (written by score_job.py)"""
+    __tablename__ = "student_risk"
+
+    student_id = Column(String, ForeignKey("students.id"), primary_key=True)
+    dropout_probability = Column(Float, nullable=False)
+    risk_level = Column(String, nullable=False)
+    model_version = Column(String, nullable=False)
+    scored_at = Column(DateTime, nullable=False)
+    # Hash of per-level progress aggregates and current_level at scoring time (change detection)
+    progress_fingerprint = Column(String, nullable=False)
+
+    student = relationship("Student", back_populates="risk")
+
+
+class CohortRollup(Base):
+    """
+    Aggregated progress per class, mentor or institute (written by reporting.py).
+    Sums and counts are stored so averages stay composable across scopes.
+    """
+    __tablename__ = "cohort_rollup"
+
+    scope = Column(String, primary_key=True)  # "class", "mentor" or "institute"
+    scope_id = Column(String, primary_key=True)
+    # Parents of a class row, so mentor/institute rows can be rebuilt from class rows
+    mentor_id = Column(String)
+    institute_id = Column(String)
+
+    students = Column(Integer, nullable=False, default=0)
+    progress_rows = Column(Integer, nullable=False, default=0)
+    marks_sum = Column(Float, nullable=False, default=0)
+    attendance_sum = Column(Float, nullable=False, default=0)
+    paid_count = Column(Integer, nullable=False, default=0)
+    rf_sum = Column(Float, nullable=False, default=0)
+
+    fingerprint = Column(String)
+    refreshed_at = Column(DateTime)
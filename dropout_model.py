@@ -1,9 +1,18 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Tuple
 import json
 import os
+from importlib.metadata import PackageNotFoundError, version
+
+from metrics import Counter, LLM_CALLS, stage, record_tokens
+from prompt_compiler import PromptCompiler, QuestionMap, load_question_set
+from output_repair import repair_json, validate_fields
+from features import RISK_LEVELS, risk_level_for
+from admission import Overloaded
 
 # -------------------------------
 # 1. Pydantic schema
@@ -26,6 +35,19 @@ class DropoutAnalysis(BaseModel):
     )
 
 
+# JSON schema handed to Gemini's structured output (response_schema)
+DROPOUT_SCHEMA = convert_to_openai_tool(DropoutAnalysis)["function"]["parameters"]
+
+# How many follow-up calls may be spent re-requesting missing fields
+MAX_FIELD_REFETCHES = 1
+
+ANALYSIS_OUTCOMES = Counter(
+    "sih_analysis_outcomes_total",
+    "Analyses by how the LLM output was obtained (strict, repaired, refetched, failed)",
+    labels=("outcome",),
+)
+
+
 # -------------------------------
 # 2. Setup Google Gemini AI (FREE!)
 # -------------------------------
@@ -111,6 +133,7 @@ RAW_FORM_RESPONSE_JSON:
 {form_response_json}
 """
 
+# Original (uncompiled) prompt layout, kept as the baseline for token accounting
 prompt = ChatPromptTemplate.from_messages([
     ("system", SYSTEM_PROMPT),
     ("system", FEWSHOT),
@@ -118,61 +141,214 @@ prompt = ChatPromptTemplate.from_messages([
 ])
 
 
+def _baseline_prompt_text(form_response: dict) -> str:
+    messages = prompt.format_messages(form_response_json=json.dumps(form_response, indent=2))
+    return "".join(m.content for m in messages)
+
+
 # -------------------------
-# 4. Build the LCEL chain
+# 4. Prompt compiler
 # -------------------------
-chain = prompt | llm
+# SYSTEM_PROMPT + FEWSHOT form the static prefix; only the compact form JSON
+# changes per call. With context caching on, the questions listed in
+# FORM_QUESTIONS_FILE (a JSON list, versioned by content) are sent as short IDs
+# and their legend is cached with the prefix.
+FORM_QUESTIONS_FILE = os.getenv("FORM_QUESTIONS_FILE")
+
+compiler = PromptCompiler(
+    static_messages=ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("system", FEWSHOT),
+    ]).format_messages(),
+    user_template=USER_PROMPT_TEMPLATE,
+    pipeline="analyze",
+    question_map=QuestionMap(load_question_set(FORM_QUESTIONS_FILE) if FORM_QUESTIONS_FILE else ()),
+    baseline_builder=_baseline_prompt_text,
+)
 
 
-def analyze_student_dropout_risk(form_response: dict) -> dict:
+def gemini_prefix_cache(prefix_messages: list):
     """
-    Analyze student dropout risk based on raw Google Form response using Google Gemini AI.
+    Context-caching hook for Gemini: uploads the static prefix once and returns
+    the cachedContents name. Enable with GEMINI_CONTEXT_CACHE=1 (the provider
+    requires a minimum prefix size, so this only pays off with a large question set).
     """
+    import datetime
+    from google.generativeai import caching
+
+    cache = caching.CachedContent.create(
+        model="models/gemini-2.5-flash-lite",
+        system_instruction="\n\n".join(m.content for m in prefix_messages),
+        ttl=datetime.timedelta(hours=1),
+    )
+    return cache.name
+
+
+def _package_version(name: str) -> tuple:
     try:
-        form_response_json = json.dumps(form_response, indent=2)
+        return tuple(int(part) for part in version(name).split(".")[:2])
+    except (PackageNotFoundError, ValueError):
+        return (0, 0)
 
-        response = chain.invoke({
-            "form_response_json": form_response_json
-        })
 
-        response_text = response.content if hasattr(response, "content") else str(response)
+# response_mime_type / response_schema / cached_content are only accepted as
+# invoke() kwargs from langchain-google-genai 2.1 on; older versions forward
+# them to generate_content and raise TypeError. There they are left out and the
+# JSON-only prompt plus local repair does the job.
+GENAI_INVOKE_KWARGS = _package_version("langchain-google-genai") >= (2, 1)
+
+if os.getenv("GEMINI_CONTEXT_CACHE") == "1":
+    if GENAI_INVOKE_KWARGS:
+        compiler.set_prefix_cache_hook(gemini_prefix_cache)
+    else:
+        print("GEMINI_CONTEXT_CACHE needs langchain-google-genai>=2.1, context caching disabled")
 
-        try:
-            start_idx = response_text.find("{")
-            end_idx = response_text.rfind("}") + 1
 
-            if start_idx != -1 and end_idx > start_idx:
-                json_str = response_text[start_idx:end_idx]
-                analysis_result = json.loads(json_str)
-            else:
-                analysis_result = json.loads(response_text)
+def _invoke_llm(compiled, extra_messages=(), schema=DROPOUT_SCHEMA, purpose="initial"):
+    kwargs = {"response_mime_type": "application/json", "response_schema": schema} if GENAI_INVOKE_KWARGS else {}
+    tail = compiled.dynamic_messages + list(extra_messages)
+    LLM_CALLS.inc(pipeline="analyze", purpose=purpose)
 
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON response: {e}")
+    if compiled.cache_handle is None:
+        return llm.invoke(compiled.prefix_messages + tail, **kwargs)
+
+    try:
+        return llm.invoke(tail, cached_content=compiled.cache_handle, **kwargs)
+    except Exception as e:
+        # Expired or evicted cache: drop the handle and send the full prompt
+        print(f"Cached prefix rejected, resending full prompt: {e}")
+        compiler.invalidate_prefix_cache()
+        LLM_CALLS.inc(pipeline="analyze", purpose=purpose)
+        return llm.invoke(compiled.prefix_messages + tail, **kwargs)
+
+
+def _response_text(response) -> str:
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def _normalize_analysis(data: dict) -> Tuple[dict, list]:
+    """
+    Validate the parsed response field by field, clamp the probability and
+    derive risk_level locally when it is missing or invalid.
+    Returns (valid_fields, missing_fields).
+    """
+    valid, missing = validate_fields(data, DropoutAnalysis)
+
+    if valid.get("risk_level") not in RISK_LEVELS:
+        valid.pop("risk_level", None)
+        if "risk_level" not in missing:
+            missing.append("risk_level")
+
+    if "dropout_probability" in valid:
+        valid["dropout_probability"] = round(min(max(valid["dropout_probability"], 0.0), 1.0), 2)
+        if "risk_level" in missing:
+            valid["risk_level"] = risk_level_for(valid["dropout_probability"])
+            missing.remove("risk_level")
+
+    return valid, missing
+
+
+def _refetch_fields(compiled, previous_text: str, missing: list) -> dict:
+    """Ask the model for only the missing fields instead of redoing the analysis"""
+    schema = {
+        "type": "object",
+        "properties": {k: v for k, v in DROPOUT_SCHEMA["properties"].items() if k in missing},
+        "required": list(missing),
+    }
+    follow_up = [
+        AIMessage(content=previous_text),
+        HumanMessage(content=(
+            f"Your JSON is missing or has invalid values for: {', '.join(missing)}. "
+            "Return ONLY a JSON object with exactly these keys."
+        )),
+    ]
+    response = _invoke_llm(compiled, follow_up, schema=schema, purpose="refetch")
+    record_tokens("analyze", response)
+    return repair_json(_response_text(response)) or {}
+
+
+def analyze_student_dropout_risk(form_response: dict) -> dict:
+    """
+    Analyze student dropout risk based on raw Google Form response using Google Gemini AI.
+    The model is asked for schema-constrained JSON; near-miss responses are repaired
+    locally and only missing fields are re-requested, so a paid response is never discarded.
+    """
+    try:
+        with stage("analyze", "compile_prompt"):
+            compiled = compiler.compile(form_response)
+
+        with stage("analyze", "llm"):
+            response = _invoke_llm(compiled)
+        record_tokens("analyze", response)
+
+        response_text = _response_text(response)
+        outcome = "strict"
+
+        with stage("analyze", "parse"):
+            try:
+                analysis_result = DropoutAnalysis.model_validate_json(response_text).model_dump()
+                valid, missing = _normalize_analysis(analysis_result)
+            except ValueError:
+                outcome = "repaired"
+                valid, missing = _normalize_analysis(repair_json(response_text) or {})
+
+        refetches = 0
+        while missing and refetches < MAX_FIELD_REFETCHES:
+            outcome = "refetched"
+            refetches += 1
+            print(f"Re-requesting missing fields: {missing}")
+
+            with stage("analyze", "refetch"):
+                fetched = _refetch_fields(compiled, response_text, missing)
+            fetched_valid, _ = _normalize_analysis({**valid, **fetched})
+            valid.update({k: v for k, v in fetched_valid.items() if k in missing})
+            missing = [f for f in missing if f not in valid]
+
+        if missing:
+            ANALYSIS_OUTCOMES.inc(outcome="failed")
             print(f"Raw response: {response_text}")
-            raise
+            raise ValueError(f"LLM response missing fields after repair: {', '.join(missing)}")
 
-        return analysis_result
+        ANALYSIS_OUTCOMES.inc(outcome=outcome)
+        analysis_result = DropoutAnalysis(**valid).model_dump()
+        return compiler.expand_ids(analysis_result)
 
     except Exception as e:
         print(f"Error analyzing student data: {e}")
         raise
 
 
-def analyze_batch_students(form_responses: List[dict]) -> List[dict]:
+def analyze_batch_students(form_responses: List[dict], analyze_fn=None) -> List[dict]:
     """
     Analyze multiple students in batch.
+    analyze_fn wraps the per-student call (e.g. admission control); defaults
+    to analyze_student_dropout_risk. Overloaded stops the batch instead of
+    queueing every remaining student: with nothing analyzed yet it propagates
+    (429), otherwise the finished results are kept and the rest come back as
+    shed entries with retry_after, so a retry only resends those.
     """
+    analyze_fn = analyze_fn or analyze_student_dropout_risk
     results = []
 
     for i, form_response in enumerate(form_responses):
         print(f"Analyzing student {i + 1}/{len(form_responses)}...")
 
         try:
-            result = analyze_student_dropout_risk(form_response)
+            result = analyze_fn(form_response)
             result["student_id"] = form_response.get("student_id", f"student_{i + 1}")
             results.append(result)
 
+        except Overloaded as e:
+            if not results:
+                raise
+            for j in range(i, len(form_responses)):
+                results.append({
+                    "student_id": form_responses[j].get("student_id", f"student_{j + 1}"),
+                    "error": str(e),
+                    "shed": True,
+                    "retry_after": e.retry_after,
+                })
+            break
         except Exception as e:
             print(f"Failed to analyze student {i + 1}: {e}")
             results.append({
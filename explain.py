@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from typing import List
+
+from features import FEATURE_COLUMNS, risk_level_for
+from metrics import stage
+
+# -------- CONFIG --------
+# Intervention suggested when a feature is a top risk driver
+FEATURE_INTERVENTIONS = {
+    "sem_no": "Transition support for the current semester",
+    "attendance_pct": "Attendance follow-up with the class mentor",
+    "new_agg_marks": "Academic mentoring / remedial classes",
+    "pct_change": "Review recent drop in marks with subject teachers",
+    "slope": "Academic mentoring for a falling marks trend",
+    "momentum": "Early check-in on latest marks decline",
+    "fee_days": "Fee assistance or scholarship referral",
+}
+
+
+def _driver(feature: str, value: float, contribution: float) -> dict:
+    return {
+        "feature": feature,
+        "value": None if np.isnan(value) else float(value),
+        "contribution": round(float(contribution), 4),
+        "intervention": FEATURE_INTERVENTIONS.get(feature),
+    }
+
+
+def explain_batch(model, features: pd.DataFrame, top_k: int = 3) -> List[dict]:
+    """
+    Exact per-feature contributions (TreeSHAP via pred_contribs) for many students
+    in one booster call. features is indexed by student_id with FEATURE_COLUMNS.
+
+    Contributions are in log-odds; positive values push towards dropout.
+    Each result lists the top_k risk drivers and protective factors.
+    """
+    if features.empty:
+        return []
+
+    X = features[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+
+    with stage("explain", "contribs"):
+        contribs = model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+
+    # Last column is the bias; the row sum is the model's log-odds
+    feature_contribs, bias = contribs[:, :-1], contribs[:, -1]
+    probabilities = 1.0 / (1.0 + np.exp(-contribs.sum(axis=1)))
+    order = np.argsort(-feature_contribs, axis=1)
+
+    results = []
+    for row, student_id in enumerate(features.index):
+        ranked = order[row]
+        drivers = [
+            _driver(FEATURE_COLUMNS[j], X[row, j], feature_contribs[row, j])
+            for j in ranked[:top_k] if feature_contribs[row, j] > 0
+        ]
+        protective = [
+            _driver(FEATURE_COLUMNS[j], X[row, j], feature_contribs[row, j])
+            for j in ranked[::-1][:top_k] if feature_contribs[row, j] < 0
+        ]
+        probability = float(probabilities[row])
+        results.append({
+            "student_id": student_id,
+            "dropout_probability": round(probability, 4),
+            "risk_level": risk_level_for(probability),
+            "base_value": round(float(bias[row]), 4),
+            "drivers": drivers,
+            "protective_factors": protective,
+        })
+
+    return results
+
+
+def rank_interventions(explanations: List[dict]) -> List[dict]:
+    """
+    Rank interventions across a cohort by the total risk contribution of the
+    drivers they address, weighted by each student's dropout probability.
+    """
+    totals = {}
+    for explanation in explanations:
+        for driver in explanation["drivers"]:
+            entry = totals.setdefault(driver["feature"], {"score": 0.0, "students": 0})
+            entry["score"] += driver["contribution"] * explanation["dropout_probability"]
+            entry["students"] += 1
+
+    ranked = sorted(totals.items(), key=lambda kv: kv[1]["score"], reverse=True)
+    return [
+        {
+            "feature": feature,
+            "intervention": FEATURE_INTERVENTIONS.get(feature),
+            "score": round(entry["score"], 4),
+            "students": entry["students"],
+        }
+        for feature, entry in ranked
+    ]
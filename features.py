@@ -0,0 +1,138 @@
+import os
+
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, text
+
+# -------- CONFIG --------
+# Same columns as the notebook dataset (student_dropout_1000_students.csv).
+# fee_days there is a per-student day count (roughly 10-24); the DB only has
+# paid/unpaid flags per subject, so featurize_progress maps the unpaid share
+# into that range (see FEE_DAYS_RANGE) instead of counting days it cannot see.
+FEATURE_COLUMNS = [
+    "sem_no",
+    "attendance_pct",
+    "new_agg_marks",
+    "pct_change",
+    "slope",
+    "momentum",
+    "fee_days",
+]
+TARGET_COLUMN = "dropout"
+ID_COLUMN = "student_id"
+FEATURE_TABLE = "student_features"
+RISK_LEVELS = ("Low", "Moderate", "High")
+
+
+def risk_level_for(probability: float) -> str:
+    """Risk band exactly as defined in dropout_model.SYSTEM_PROMPT"""
+    if probability <= 0.30:
+        return "Low"
+    if probability <= 0.60:
+        return "Moderate"
+    return "High"
+
+
+# -------- LOADING --------
+def load_feature_frame(source: str, table: str = FEATURE_TABLE, query: str = None) -> pd.DataFrame:
+    """
+    Load a labelled feature frame from a Parquet/CSV file or a database.
+    source is a file path (.parquet / .csv) or a SQLAlchemy URL
+    (e.g. sqlite:///university.db), in which case table or query is read.
+    """
+    ext = os.path.splitext(source)[1].lower()
+    if ext in (".parquet", ".pq"):
+        df = pd.read_parquet(source)
+    elif ext == ".csv":
+        df = pd.read_csv(source)
+    else:
+        engine = create_engine(source)
+        with engine.connect() as conn:
+            df = pd.read_sql(query or f"SELECT * FROM {table}", conn)
+
+    missing = [c for c in FEATURE_COLUMNS + [TARGET_COLUMN] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Feature source {source} is missing columns: {missing}")
+
+    return df
+
+
+# -------- FEATURIZATION FROM student_progress --------
+# The DB only stores a paid/unpaid flag, not due dates. The share of unpaid
+# subjects at the latest level is mapped linearly onto the notebook's fee_days
+# range, so scored students stay inside what the model was trained on.
+FEE_DAYS_RANGE = (10.0, 24.0)
+# Bump whenever featurize_progress changes meaning; score_job rescores everyone
+FEATURIZATION_VERSION = 2
+
+
+def featurize_progress(progress: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized featurization of student_progress rows into FEATURE_COLUMNS.
+    progress needs student_id, level, marks, attendance, payment and
+    current_level columns; returns one row per student indexed by student_id.
+
+    - sem_no:          the student's current level
+    - attendance_pct:  mean attendance at the latest level
+    - new_agg_marks:   mean marks at the latest level
+    - pct_change:      % change in mean marks vs the previous level
+    - slope:           least-squares slope of mean marks over levels
+    - momentum:        change in mean marks between the two latest levels
+    - fee_days:        share of unpaid subjects at the latest level, mapped onto FEE_DAYS_RANGE
+    """
+    progress = progress.assign(unpaid=(~progress["payment"].astype(bool)).astype(int))
+
+    per_level = (
+        progress.groupby([ID_COLUMN, "level"], sort=True)
+        .agg(marks=("marks", "mean"), attendance=("attendance", "mean"), unpaid=("unpaid", "mean"))
+        .reset_index()
+    )
+
+    per_level["prev_marks"] = per_level.groupby(ID_COLUMN, sort=False)["marks"].shift(1)
+    grouped = per_level.groupby(ID_COLUMN, sort=False)
+    latest = grouped.tail(1).set_index(ID_COLUMN)
+    previous = latest["prev_marks"]
+
+    # slope = cov(level, marks) / var(level), from per-student sums
+    x, y = per_level["level"].astype(float), per_level["marks"]
+    sums = per_level.assign(x=x, y=y, xy=x * y, xx=x * x).groupby(ID_COLUMN)[["x", "y", "xy", "xx"]].sum()
+    n = grouped.size()
+    denom = n * sums["xx"] - sums["x"] ** 2
+    slope = ((n * sums["xy"] - sums["x"] * sums["y"]) / denom.where(denom != 0)).fillna(0.0)
+
+    current_level = progress.groupby(ID_COLUMN)["current_level"].first()
+
+    features = pd.DataFrame(index=latest.index)
+    features["sem_no"] = current_level.reindex(latest.index).fillna(latest["level"])
+    features["attendance_pct"] = latest["attendance"]
+    features["new_agg_marks"] = latest["marks"]
+    features["pct_change"] = ((latest["marks"] - previous) / previous.where(previous != 0) * 100).fillna(0.0)
+    features["slope"] = slope.reindex(latest.index)
+    features["momentum"] = (latest["marks"] - previous).fillna(0.0)
+    low, high = FEE_DAYS_RANGE
+    features["fee_days"] = low + latest["unpaid"] * (high - low)
+
+    return features[FEATURE_COLUMNS].astype(float)
+
+
+PROGRESS_SQL = text("""
+    SELECT p.student_id, p.level, p.marks, p.attendance, p.payment, s.current_level
+    FROM student_progress p
+    JOIN students s ON s.id = p.student_id
+    WHERE p.student_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+
+# Stays under SQLite's default limit of 999 bound parameters per IN (...)
+IDS_PER_QUERY = 900
+
+
+def load_student_features(conn, student_ids) -> pd.DataFrame:
+    """Featurize the given students straight from student_progress"""
+    student_ids = list(student_ids)
+    frames = [
+        pd.read_sql(PROGRESS_SQL, conn, params={"ids": student_ids[i:i + IDS_PER_QUERY]})
+        for i in range(0, len(student_ids), IDS_PER_QUERY)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=FEATURE_COLUMNS)
+    return featurize_progress(pd.concat(frames, ignore_index=True))
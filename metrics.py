@@ -0,0 +1,293 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# -------- CONFIG --------
+# Fraction of requests that run under cProfile (0 disables profiling)
+PROFILE_SAMPLE_RATE = float(os.getenv("SIH_PROFILE_SAMPLE_RATE", "0"))
+# Only profiles of requests slower than this are written to disk
+PROFILE_SLOW_SECONDS = float(os.getenv("SIH_PROFILE_SLOW_SECONDS", "2.0"))
+PROFILE_DIR = os.getenv("SIH_PROFILE_DIR", "./profiles")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+# -------- METRIC TYPES --------
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: dict):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(labels[n] for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def snapshot(self) -> dict:
+        """Copy of every series: label-value tuple (in label order) -> value"""
+        with self._lock:
+            return dict(self._values)
+
+    def total(self, **labels) -> float:
+        """Sum over every series matching the given subset of labels"""
+        idx = {self.label_names.index(k): v for k, v in labels.items()}
+        with self._lock:
+            return sum(
+                value for key, value in self._values.items()
+                if all(key[i] == v for i, v in idx.items())
+            )
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (bucket_counts, total, count) in items:
+            for bound, n in zip(self.buckets, bucket_counts):
+                labels = _format_labels(self.label_names, key, ("le", repr(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {n}")
+            labels = _format_labels(self.label_names, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            plain = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+# -------- APPLICATION METRICS --------
+STAGE_SECONDS = Histogram(
+    "sih_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    labels=("pipeline", "stage"),
+)
+REQUEST_SECONDS = Histogram(
+    "sih_request_duration_seconds",
+    "End-to-end request latency per endpoint",
+    labels=("endpoint",),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "sih_requests_in_flight",
+    "Requests currently being processed per endpoint",
+    labels=("endpoint",),
+)
+REQUEST_ERRORS = Counter(
+    "sih_request_errors_total",
+    "Requests that raised an exception per endpoint",
+    labels=("endpoint",),
+)
+LLM_TOKENS = Counter(
+    "sih_llm_tokens_total",
+    "LLM tokens consumed per pipeline (kind is prompt or completion)",
+    labels=("pipeline", "kind"),
+)
+LLM_CALLS = Counter(
+    "sih_llm_calls_total",
+    "LLM calls per pipeline (purpose is initial or a follow-up such as refetch)",
+    labels=("pipeline", "purpose"),
+)
+CACHE_REQUESTS = Counter(
+    "sih_cache_requests_total",
+    "Cache lookups per cache (result is hit or miss)",
+    labels=("cache", "result"),
+)
+PROFILES_WRITTEN = Counter(
+    "sih_profiles_written_total",
+    "Sampled cProfile dumps written for slow requests",
+    labels=("endpoint",),
+)
+
+
+@contextmanager
+def stage(pipeline: str, name: str):
+    """Time a block of work as one stage of a pipeline."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, pipeline=pipeline, stage=name)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_tokens(pipeline: str, response):
+    """
+    Record token usage from an LLM response.
+    Understands LangChain messages (usage_metadata dict) and
+    google.generativeai responses (usage_metadata object).
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return
+
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+    else:
+        prompt_tokens = getattr(usage, "prompt_token_count", 0)
+        completion_tokens = getattr(usage, "candidates_token_count", 0)
+
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, pipeline=pipeline, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, pipeline=pipeline, kind="completion")
+
+
+# -------- REQUEST TRACKING + SAMPLED PROFILING --------
+# cProfile cannot run two profilers at once, so only one request is sampled at a time
+_profile_lock = threading.Lock()
+
+
+def _dump_profile(profiler, endpoint: str, elapsed: float):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_name = endpoint.strip("/").replace("/", "_") or "root"
+    path = os.path.join(PROFILE_DIR, f"{safe_name}-{int(time.time() * 1000)}-{elapsed:.2f}s.prof")
+    profiler.dump_stats(path)
+    PROFILES_WRITTEN.inc(endpoint=endpoint)
+
+
+@contextmanager
+def track_request(endpoint: str):
+    """
+    Track in-flight count, latency and errors for one request.
+    A sampled fraction of requests runs under cProfile; the profile is
+    dumped to PROFILE_DIR only if the request was slower than PROFILE_SLOW_SECONDS.
+    """
+    profiler = None
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        if _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+    REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        REQUEST_ERRORS.inc(endpoint=endpoint)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+
+        if profiler is not None:
+            profiler.disable()
+            try:
+                if elapsed >= PROFILE_SLOW_SECONDS:
+                    _dump_profile(profiler, endpoint, elapsed)
+            finally:
+                _profile_lock.release()
+
+
+# -------- PROMETHEUS EXPOSITION --------
+def _cache_hit_ratio_lines():
+    values = CACHE_REQUESTS.snapshot()
+
+    caches = sorted({cache for cache, _ in values})
+    lines = [
+        "# HELP sih_cache_hit_ratio Fraction of cache lookups that were hits",
+        "# TYPE sih_cache_hit_ratio gauge",
+    ]
+    for cache in caches:
+        hits = values.get((cache, "hit"), 0.0)
+        total = hits + values.get((cache, "miss"), 0.0)
+        ratio = hits / total if total else 0.0
+        lines.append(f"sih_cache_hit_ratio{_format_labels(('cache',), (cache,))} {ratio}")
+    return lines
+
+
+def render_prometheus() -> str:
+    """Render every registered metric in Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    lines.extend(_cache_hit_ratio_lines())
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,4 @@
+import time
 
 from populate import engine  # your SQLAlchemy engine
 
@@ -5,6 +6,10 @@ from langchain_community.utilities import SQLDatabase
 from langchain.agents import create_sql_agent
 from langchain.agents.agent_toolkits import SQLDatabaseToolkit
 from langchain_huggingface import HuggingFaceEndpoint
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import STAGE_SECONDS, LLM_TOKENS, stage
+from admission import Priority, huggingface_admission, request_key
 
 
 # Setup database and LLM
@@ -23,10 +28,60 @@ agent = create_sql_agent(
     handle_parsing_errors=True
 )
 
-def ask_agent(question: str):
-    """Ask the AI agent a question about the database"""
-    result = agent.invoke({"input": question})
-    return result["output"]
+class StageTimingHandler(BaseCallbackHandler):
+    """Times every LLM call and SQL tool call the agent makes"""
+
+    def __init__(self):
+        self._starts = {}
+
+    def _start(self, run_id):
+        self._starts[run_id] = time.perf_counter()
+
+    def _end(self, run_id, stage_name):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            STAGE_SECONDS.observe(time.perf_counter() - start, pipeline="nl2sql", stage=stage_name)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "llm")
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("prompt_tokens"):
+            LLM_TOKENS.inc(usage["prompt_tokens"], pipeline="nl2sql", kind="prompt")
+        if usage.get("completion_tokens"):
+            LLM_TOKENS.inc(usage["completion_tokens"], pipeline="nl2sql", kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "llm")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, "tool")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "tool")
+
+
+def ask_agent(question: str, priority: Priority = Priority.INTERACTIVE, tenant: str = None):
+    """
+    Ask the AI agent a question about the database.
+    Goes through the Hugging Face admission controller; raises admission.Overloaded when shed.
+    """
+    def invoke():
+        with stage("nl2sql", "agent"):
+            result = agent.invoke(
+                {"input": question},
+                config={"callbacks": [StageTimingHandler()]},
+            )
+        return result["output"]
+
+    return huggingface_admission.run(
+        invoke, priority=priority, tenant=tenant, key=request_key("nl2sql", question)
+    )
 
 if __name__ == "__main__":
     def test_agent():
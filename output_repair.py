@@ -0,0 +1,185 @@
+import json
+import re
+from typing import Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+# -------- CONFIG --------
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+# Smart quotes used as string delimiters -> the characters that may close them
+_SMART_DELIMITERS = {"“": "”“\"", "”": "”“\"", "‘": "’‘'", "’": "’‘'"}
+_JSON_LITERALS = ("true", "false", "null")
+_TRAILING_SCALAR_RE = re.compile(r"[-+\w.]+$")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+# -------- EXTRACTION --------
+def extract_json_object(text: str) -> Optional[str]:
+    """
+    Return the first top-level {...} block in text (ignoring braces inside strings).
+    If the object is never closed, everything from the first '{' is returned so
+    repair_json can try to close it.
+    """
+    text = _FENCE_RE.sub("", text.strip())
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    return text[start:]
+
+
+# -------- REPAIR --------
+def _normalize_tokens(text: str) -> str:
+    """
+    Single pass outside of double-quoted strings: single-quoted and
+    smart-quoted strings become double-quoted and Python literals become JSON
+    literals. Smart quotes inside proper strings are left alone.
+    """
+    out = []
+    i = 0
+    in_double = False
+    while i < len(text):
+        ch = text[i]
+        if in_double:
+            out.append(ch)
+            if ch == "\\" and i + 1 < len(text):
+                out.append(text[i + 1])
+                i += 1
+            elif ch == '"':
+                in_double = False
+        elif ch == '"':
+            in_double = True
+            out.append(ch)
+        elif ch == "'" or ch in _SMART_DELIMITERS:
+            # 'single quoted' / “smart quoted” -> "double quoted"
+            closers = _SMART_DELIMITERS.get(ch, "'")
+            end = i + 1
+            while end < len(text) and text[end] not in closers:
+                end += 2 if text[end] == "\\" else 1
+            inner = text[i + 1:end].replace("\\'", "'").replace('"', '\\"')
+            out.append(f'"{inner}"' if end < len(text) else f'"{inner}')
+            i = end
+        elif ch.isalpha():
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.append(_PY_LITERALS.get(word, word))
+            i = end - 1
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _close_unbalanced(text: str) -> str:
+    """
+    Close any open arrays/objects of truncated output. The value that was cut
+    off (an unterminated string, a number or a partial literal) is dropped, as
+    is a dangling key, so only complete fields survive.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    string_start = 0
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            string_start = i
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+
+    if not stack:
+        return text
+
+    if in_string:
+        text = text[:string_start]
+    text = text.rstrip()
+    scalar = _TRAILING_SCALAR_RE.search(text)
+    if scalar and scalar.group(0) not in _JSON_LITERALS:
+        text = text[:scalar.start()].rstrip()
+
+    text = text.rstrip(",")
+    # A dangling key ("key": or a bare "key" inside an object) cannot be completed; drop it
+    text = re.sub(r',?\s*"[^"]*"\s*:\s*$', "", text)
+    if stack[-1] == "}":
+        text = re.sub(r'([{,])\s*"[^"]*"\s*$', r"\1", text)
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[dict]:
+    """
+    Best-effort parse of a near-miss JSON response: code fences, surrounding
+    prose, smart quotes, single quotes, Python literals, trailing commas and
+    truncated output are handled. Returns None if nothing usable is found.
+    """
+    candidate = extract_json_object(text)
+    if candidate is None:
+        return None
+
+    try:
+        parsed = json.loads(candidate)
+        return parsed if isinstance(parsed, dict) else None
+    except json.JSONDecodeError:
+        pass
+
+    candidate = _normalize_tokens(candidate)
+    candidate = _close_unbalanced(candidate)
+    candidate = _TRAILING_COMMA_RE.sub(r"\1", candidate)
+
+    try:
+        parsed = json.loads(candidate)
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+# -------- VALIDATION --------
+def validate_fields(data: dict, schema: Type[BaseModel]) -> Tuple[dict, list]:
+    """
+    Validate each schema field independently so one bad field does not discard
+    the rest. Returns (valid_fields, missing_or_invalid_field_names).
+    Unknown keys are dropped.
+    """
+    valid, missing = {}, []
+    for name, field in schema.model_fields.items():
+        if name not in data or data[name] is None:
+            missing.append(name)
+            continue
+        try:
+            valid[name] = TypeAdapter(field.annotation).validate_python(data[name])
+        except ValidationError:
+            missing.append(name)
+    return valid, missing
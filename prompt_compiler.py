@@ -0,0 +1,276 @@
+import hashlib
+import json
+import math
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from metrics import Counter, record_cache
+
+# -------- CONFIG --------
+QUESTION_ID_RE = re.compile(r"\bq[0-9a-f]{6,}\b")
+_INNER_SPACES_RE = re.compile(r"(?<=\S) {2,}")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+PROMPT_TOKENS = Counter(
+    "sih_prompt_tokens_total",
+    "Estimated prompt tokens per section; baseline is the uncompiled prompt, "
+    "sent excludes a cached static prefix",
+    labels=("pipeline", "section"),
+)
+
+
+# -------- TOKEN COUNTING --------
+def estimate_tokens(text: str) -> int:
+    """Cheap offline estimate (~4 characters per token)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def compact_whitespace(text: str) -> str:
+    """Drop trailing spaces, alignment padding and repeated blank lines; keeps indentation"""
+    lines = [_INNER_SPACES_RE.sub(" ", line.rstrip()) for line in text.strip("\n").split("\n")]
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines))
+
+
+# -------- QUESTION IDS --------
+class QuestionMap:
+    """
+    Fixed, versioned set of form questions mapped to short stable IDs
+    (q + first hex digits of sha1) and back. IDs only depend on the question
+    text, so they are the same across processes and restarts. Keys outside the
+    set are never shortened, so the legend (and any cached prefix) cannot grow
+    with traffic.
+    """
+
+    def __init__(self, questions=(), id_len: int = 6):
+        self._by_id = {}
+        self._by_question = {}
+
+        for question in sorted(set(questions)):
+            digest = hashlib.sha1(question.strip().encode("utf-8")).hexdigest()
+            length = id_len
+            qid = "q" + digest[:length]
+            # Extremely unlikely, but never let two questions share an ID
+            while qid in self._by_id:
+                length += 1
+                qid = "q" + digest[:length]
+
+            self._by_id[qid] = question
+            self._by_question[question] = qid
+
+        self.version = hashlib.sha1(
+            json.dumps(sorted(self._by_question), ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:8]
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def id_for(self, question: str) -> Optional[str]:
+        return self._by_question.get(question)
+
+    def question_for(self, qid: str) -> Optional[str]:
+        return self._by_id.get(qid)
+
+    def legend(self) -> Dict[str, str]:
+        """IDs -> question text, sorted by ID so the text is stable"""
+        return dict(sorted(self._by_id.items()))
+
+    def shorten(self, form_response: dict) -> dict:
+        return {
+            (self._by_question.get(k, k) if isinstance(k, str) else k): v
+            for k, v in form_response.items()
+        }
+
+    def expand(self, text: str) -> str:
+        """Replace question IDs in model output with the original question text"""
+        def _sub(match):
+            return self.question_for(match.group(0)) or match.group(0)
+
+        return QUESTION_ID_RE.sub(_sub, text)
+
+
+def load_question_set(path: str) -> List[str]:
+    """Question texts from a JSON file holding a list (or an object keyed by question)"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return list(data)
+
+
+# -------- COMPILED PROMPT --------
+@dataclass
+class CompiledPrompt:
+    prefix_messages: list
+    dynamic_messages: list
+    section_tokens: Dict[str, int]
+    baseline_tokens: int
+    cache_handle: Optional[str] = None
+
+    @property
+    def messages(self) -> list:
+        return self.prefix_messages + self.dynamic_messages
+
+    @property
+    def sent_tokens(self) -> int:
+        """Tokens actually sent: the static prefix is skipped when it is cached"""
+        sent = self.section_tokens["dynamic"]
+        if self.cache_handle is None:
+            sent += self.section_tokens["static_prefix"]
+        return sent
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.baseline_tokens - self.sent_tokens
+
+    def report(self) -> dict:
+        return {
+            "sections": dict(self.section_tokens),
+            "baseline_tokens": self.baseline_tokens,
+            "sent_tokens": self.sent_tokens,
+            "saved_tokens": self.saved_tokens,
+            "prefix_cached": self.cache_handle is not None,
+        }
+
+
+class PromptCompiler:
+    """
+    Turns a raw form response into prompt messages:
+    - static instructions and the form JSON are whitespace-compacted
+    - tokens are counted per section and compared with the uncompiled prompt
+    - the static prefix can be handed to a provider context-cache hook once
+    - only while that prefix is cached, known questions become short IDs and
+      their legend joins the prefix (uncached, the legend would cost more than
+      the IDs save)
+    """
+
+    def __init__(
+        self,
+        static_messages: List[SystemMessage],
+        user_template: str,
+        pipeline: str = "analyze",
+        question_map: Optional[QuestionMap] = None,
+        token_counter: Callable[[str], int] = estimate_tokens,
+        baseline_builder: Optional[Callable[[dict], str]] = None,
+    ):
+        self.static_messages = [
+            m.__class__(content=compact_whitespace(m.content)) for m in static_messages
+        ]
+        # Compacted before the form JSON goes in, so student answers are sent verbatim
+        self.user_template = compact_whitespace(user_template)
+        self.pipeline = pipeline
+        self.question_map = question_map or QuestionMap()
+        self.count_tokens = token_counter
+        self.baseline_builder = baseline_builder
+
+        self._static_text = "".join(m.content for m in self.static_messages)
+        self._instructions_tokens = self.count_tokens(self._static_text)
+        self._prefix_cache_hook = None
+        self._prefix_handles = {}
+        self._lock = threading.Lock()
+
+    def set_prefix_cache_hook(self, hook: Optional[Callable[[list], Optional[str]]]):
+        """
+        Register a provider context-caching hook. It receives the static prefix
+        messages and returns a cache handle (e.g. a Gemini cachedContents name)
+        or None. It is called once per distinct prefix.
+        """
+        with self._lock:
+            self._prefix_cache_hook = hook
+            self._prefix_handles = {}
+
+    def invalidate_prefix_cache(self):
+        """Forget cache handles (e.g. after the provider reports an expired cache)"""
+        with self._lock:
+            self._prefix_handles = {}
+
+    def _legend_message(self) -> Optional[SystemMessage]:
+        legend = self.question_map.legend()
+        if not legend:
+            return None
+        return SystemMessage(content=(
+            f"QUESTION_LEGEND v{self.question_map.version} "
+            "(form keys are short question IDs; cite the ID in psychological_reasons):\n"
+            + json.dumps(legend, ensure_ascii=False, separators=(",", ":"))
+        ))
+
+    def _cache_handle(self, prefix_messages: list, prefix_text: str) -> Optional[str]:
+        hook = self._prefix_cache_hook
+        if hook is None:
+            return None
+
+        key = hashlib.sha1(prefix_text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._prefix_handles:
+                handle = self._prefix_handles[key]
+                # A remembered hook failure still sends the full prefix
+                record_cache("prompt_prefix", handle is not None)
+                return handle
+
+        record_cache("prompt_prefix", False)
+        try:
+            handle = hook(prefix_messages)
+        except Exception as e:
+            print(f"Prefix cache hook failed, sending full prompt: {e}")
+            handle = None
+
+        with self._lock:
+            self._prefix_handles[key] = handle
+        return handle
+
+    def compile(self, form_response: dict) -> CompiledPrompt:
+        prefix_messages = list(self.static_messages)
+        legend_text = ""
+        cache_handle = None
+
+        if self._prefix_cache_hook is not None:
+            legend = self._legend_message()
+            if legend is not None:
+                prefix_messages.append(legend)
+                legend_text = legend.content
+            cache_handle = self._cache_handle(prefix_messages, self._static_text + legend_text)
+            if cache_handle is None:
+                # The prefix is sent in full anyway, so keep the full question keys
+                prefix_messages = list(self.static_messages)
+                legend_text = ""
+
+        form = self.question_map.shorten(form_response) if legend_text else form_response
+        form_json = json.dumps(form, ensure_ascii=False, separators=(",", ":"))
+        dynamic_messages = [HumanMessage(content=self.user_template.format(form_response_json=form_json))]
+        dynamic_text = dynamic_messages[0].content
+
+        section_tokens = {
+            "instructions": self._instructions_tokens,
+            "legend": self.count_tokens(legend_text),
+            "dynamic": self.count_tokens(dynamic_text),
+        }
+        section_tokens["static_prefix"] = section_tokens["instructions"] + section_tokens["legend"]
+
+        if self.baseline_builder is not None:
+            baseline_tokens = self.count_tokens(self.baseline_builder(form_response))
+        else:
+            baseline_tokens = section_tokens["static_prefix"] + section_tokens["dynamic"]
+
+        compiled = CompiledPrompt(
+            prefix_messages=prefix_messages,
+            dynamic_messages=dynamic_messages,
+            section_tokens=section_tokens,
+            baseline_tokens=baseline_tokens,
+            cache_handle=cache_handle,
+        )
+
+        for section in ("static_prefix", "dynamic"):
+            PROMPT_TOKENS.inc(section_tokens[section], pipeline=self.pipeline, section=section)
+        PROMPT_TOKENS.inc(compiled.baseline_tokens, pipeline=self.pipeline, section="baseline")
+        PROMPT_TOKENS.inc(compiled.sent_tokens, pipeline=self.pipeline, section="sent")
+        return compiled
+
+    def expand_ids(self, analysis: dict) -> dict:
+        """Map question IDs cited in psychological_reasons back to the question text"""
+        reasons = analysis.get("psychological_reasons")
+        if isinstance(reasons, list):
+            analysis["psychological_reasons"] = [
+                self.question_map.expand(r) if isinstance(r, str) else r for r in reasons
+            ]
+        return analysis
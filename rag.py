@@ -6,6 +6,8 @@ from langchain_community.document_loaders import TextLoader
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 
+from metrics import stage, record_tokens
+
 # -------- CONFIG --------
 KB_DIR = "./kb_texts"
 PERSIST_DIR = "./chroma_univ_kb"
@@ -52,16 +54,18 @@ def load_txt_documents(kb_dir: str):
 
 
 # -------- BUILD VECTORSTORE --------
-def build_vectorstore(docs):
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+def build_vectorstore(docs, embeddings=None, collection_name=COLLECTION_NAME,
+                      persist_directory=PERSIST_DIR):
+    if embeddings is None:
+        embeddings = HuggingFaceEmbeddings(
+            model_name="sentence-transformers/all-MiniLM-L6-v2"
+        )
 
     vs = Chroma.from_documents(
         documents=docs,
         embedding=embeddings,
-        collection_name=COLLECTION_NAME,
-        persist_directory=PERSIST_DIR,
+        collection_name=collection_name,
+        persist_directory=persist_directory,
     )
 
     return vs
@@ -69,7 +73,8 @@ def build_vectorstore(docs):
 
 # -------- GEMINI ANSWERING --------
 def get_gemini_answer(context: str, question: str) -> str:
-    prompt = f"""
+    with stage("rag", "prompt_build"):
+        prompt = f"""
 You are a student-support assistant.
 Use ONLY the information in the context below to answer the question.
 If the answer is not in the context, say: "Information not available in context."
@@ -82,16 +87,23 @@ Question:
 
 Answer clearly:
 """
-    response = GEMINI_MODEL.generate_content(prompt)
+    with stage("rag", "llm"):
+        response = GEMINI_MODEL.generate_content(prompt)
+    record_tokens("rag", response)
     return response.text
 
 
 # -------- RAG PIPELINE (FIXED) --------
 def get_rag_answer(vectorstore, query: str, k: int = 3):
-    # FIXED: Use similarity_search instead of retriever.invoke
-    docs = vectorstore.similarity_search(query, k=k)
+    # Embed and search separately so each stage shows up in /metrics
+    with stage("rag", "embed"):
+        query_embedding = vectorstore.embeddings.embed_query(query)
+
+    with stage("rag", "vector_search"):
+        docs = vectorstore.similarity_search_by_vector(query_embedding, k=k)
 
-    combined = "\n\n".join([d.page_content for d in docs])
+    with stage("rag", "context_build"):
+        combined = "\n\n".join([d.page_content for d in docs])
     final_answer = get_gemini_answer(combined, query)
 
     return docs, combined, final_answer
@@ -0,0 +1,306 @@
+"""
+Cohort reporting without N+1 ORM loads.
+
+- Rollups: marks / attendance / payment / rf aggregated per class, mentor and
+  institute into cohort_rollup. Class rows come from one GROUP BY query and are
+  only rewritten when they changed; mentor and institute rows are rebuilt from
+  the class rows of the affected parents only.
+- Exports: one joined query streamed with a server-side cursor and written to
+  CSV or Parquet batch by batch, so memory stays flat regardless of table size.
+
+    python reporting.py refresh
+    python reporting.py export --format parquet --out student_progress.parquet
+"""
+import argparse
+import csv
+import io
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, bindparam, select, text
+
+from db import Base, Class, CohortRollup, Institute, Mentor, Student, StudentProgress, Subject
+from features import IDS_PER_QUERY
+from metrics import stage
+
+# -------- CONFIG --------
+ROLLUP_SCOPES = ("class", "mentor", "institute")
+EXPORT_BATCH_SIZE = 5000
+
+CLASS_ROLLUP_SQL = """
+    SELECT c.id AS scope_id, c.mentor_id, c.institute_id,
+           COUNT(DISTINCT s.id) AS students,
+           COUNT(p.id) AS progress_rows,
+           COALESCE(SUM(p.marks), 0) AS marks_sum,
+           COALESCE(SUM(p.attendance), 0) AS attendance_sum,
+           COALESCE(SUM(CASE WHEN p.payment THEN 1 ELSE 0 END), 0) AS paid_count,
+           -- Rounded: float sums depend on row order, which differs between the
+           -- full and the class-scoped query and would change the fingerprint
+           COALESCE(ROUND(SUM(p.rf), 6), 0) AS rf_sum
+    FROM classes c
+    LEFT JOIN students s ON s.class_id = c.id
+    LEFT JOIN student_progress p ON p.student_id = s.id
+    {where}
+    GROUP BY c.id, c.mentor_id, c.institute_id
+"""
+
+# Parent rollups are sums of their class rows (column names come from a fixed whitelist)
+PARENT_ROLLUP_SQL = """
+    INSERT INTO cohort_rollup (scope, scope_id, students, progress_rows, marks_sum,
+                               attendance_sum, paid_count, rf_sum, refreshed_at)
+    SELECT :scope, {parent}, SUM(students), SUM(progress_rows), SUM(marks_sum),
+           SUM(attendance_sum), SUM(paid_count), SUM(rf_sum), :refreshed_at
+    FROM cohort_rollup
+    WHERE scope = 'class' AND {parent} IN :ids
+    GROUP BY {parent}
+"""
+
+SCOPE_NAMES = {
+    "class": (Class.__table__, "name"),
+    "mentor": (Mentor.__table__, "email"),
+    "institute": (Institute.__table__, "name"),
+}
+
+_rollup = CohortRollup.__table__
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), IDS_PER_QUERY):
+        yield ids[i:i + IDS_PER_QUERY]
+
+
+def _fingerprint(row) -> str:
+    return "|".join(str(row[k]) for k in (
+        "mentor_id", "institute_id", "students", "progress_rows",
+        "marks_sum", "attendance_sum", "paid_count", "rf_sum",
+    ))
+
+
+# -------- ROLLUPS --------
+def _fresh_class_rows(conn, class_ids=None):
+    if class_ids is None:
+        return [dict(r) for r in conn.execute(text(CLASS_ROLLUP_SQL.format(where=""))).mappings()]
+
+    query = text(CLASS_ROLLUP_SQL.format(where="WHERE c.id IN :ids")).bindparams(
+        bindparam("ids", expanding=True)
+    )
+    rows = []
+    for chunk in _chunks(class_ids):
+        rows.extend(dict(r) for r in conn.execute(query, {"ids": chunk}).mappings())
+    return rows
+
+
+def refresh_rollups(engine, class_ids=None) -> dict:
+    """
+    Bring cohort_rollup up to date. With class_ids only those classes are
+    re-aggregated (score_job.py passes the classes of the students it just
+    rescored); otherwise every class is checked, which also catches removed
+    classes and rf-only edits. Only changed rows are rewritten.
+    """
+    Base.metadata.create_all(engine, tables=[_rollup])
+    now = datetime.now(timezone.utc)
+
+    with engine.begin() as conn:
+        with stage("reporting", "aggregate_classes"):
+            fresh = _fresh_class_rows(conn, class_ids)
+
+        stored = {
+            r.scope_id: r
+            for r in conn.execute(
+                select(_rollup.c.scope_id, _rollup.c.mentor_id, _rollup.c.institute_id, _rollup.c.fingerprint)
+                .where(_rollup.c.scope == "class")
+            )
+        }
+
+        changed = []
+        for row in fresh:
+            row["fingerprint"] = _fingerprint(row)
+            old = stored.get(row["scope_id"])
+            if old is None or old.fingerprint != row["fingerprint"]:
+                changed.append(row)
+
+        # Classes that no longer exist (only detectable on a full refresh)
+        removed = set(stored) - {r["scope_id"] for r in fresh} if class_ids is None else set()
+
+        dirty = {"mentor": set(), "institute": set()}
+        for class_id in [r["scope_id"] for r in changed] + list(removed):
+            old = stored.get(class_id)
+            if old is not None:
+                dirty["mentor"].add(old.mentor_id)
+                dirty["institute"].add(old.institute_id)
+        for row in changed:
+            dirty["mentor"].add(row["mentor_id"])
+            dirty["institute"].add(row["institute_id"])
+
+        with stage("reporting", "write_rollups"):
+            stale_ids = [r["scope_id"] for r in changed] + list(removed)
+            for chunk in _chunks(stale_ids):
+                conn.execute(_rollup.delete().where(_rollup.c.scope == "class", _rollup.c.scope_id.in_(chunk)))
+            if changed:
+                conn.execute(_rollup.insert(), [
+                    {**row, "scope": "class", "refreshed_at": now} for row in changed
+                ])
+
+            for scope, ids in dirty.items():
+                ids.discard(None)
+                parent = f"{scope}_id"
+                insert = text(PARENT_ROLLUP_SQL.format(parent=parent)).bindparams(
+                    bindparam("ids", expanding=True),
+                    # Same DateTime processing as the Core insert of the class rows
+                    bindparam("refreshed_at", type_=DateTime()),
+                )
+                for chunk in _chunks(ids):
+                    conn.execute(_rollup.delete().where(_rollup.c.scope == scope, _rollup.c.scope_id.in_(chunk)))
+                    conn.execute(insert, {"scope": scope, "refreshed_at": now, "ids": chunk})
+
+    summary = {
+        "classes": len(changed) + len(removed),
+        "mentors": len(dirty["mentor"]),
+        "institutes": len(dirty["institute"]),
+    }
+    print(f"Rollups refreshed: {summary}")
+    return summary
+
+
+def get_rollups(conn, scope: str) -> list:
+    """Rollup rows for one scope with averages computed from the stored sums"""
+    if scope not in ROLLUP_SCOPES:
+        raise ValueError(f"Unknown rollup scope {scope!r}, expected one of {ROLLUP_SCOPES}")
+
+    names, name_col = SCOPE_NAMES[scope]
+    query = (
+        select(_rollup, names.c[name_col].label("name"))
+        .select_from(_rollup.outerjoin(names, names.c.id == _rollup.c.scope_id))
+        .where(_rollup.c.scope == scope)
+        .order_by(_rollup.c.scope_id)
+    )
+
+    results = []
+    for r in conn.execute(query).mappings():
+        rows = r["progress_rows"] or 0
+        results.append({
+            "scope": scope,
+            "id": r["scope_id"],
+            "name": r["name"],
+            "students": r["students"],
+            "progress_rows": rows,
+            "avg_marks": round(r["marks_sum"] / rows, 2) if rows else None,
+            "avg_attendance": round(r["attendance_sum"] / rows, 2) if rows else None,
+            "payment_rate": round(r["paid_count"] / rows, 4) if rows else None,
+            "avg_rf": round(r["rf_sum"] / rows, 4) if rows else None,
+            "refreshed_at": r["refreshed_at"],
+        })
+    return results
+
+
+# -------- STREAMING EXPORTS --------
+def export_query():
+    """Every progress row with its student, class, institute and subject in one joined query"""
+    return (
+        select(
+            StudentProgress.id.label("progress_id"),
+            Student.enroll_no,
+            Student.name.label("student_name"),
+            Class.name.label("class_name"),
+            Institute.name.label("institute_name"),
+            Subject.code.label("subject_code"),
+            Subject.name.label("subject_name"),
+            StudentProgress.level,
+            StudentProgress.marks,
+            StudentProgress.attendance,
+            StudentProgress.payment,
+            StudentProgress.rf,
+        )
+        .select_from(StudentProgress)
+        .join(Student, StudentProgress.student_id == Student.id)
+        .outerjoin(Subject, StudentProgress.subject_id == Subject.id)
+        .outerjoin(Class, Student.class_id == Class.id)
+        .outerjoin(Institute, Student.institute_id == Institute.id)
+    )
+
+
+EXPORT_COLUMNS = list(export_query().selected_columns.keys())
+
+
+def iter_export_batches(engine, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield lists of row tuples from a server-side cursor"""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(export_query())
+        for batch in result.partitions(batch_size):
+            yield batch
+
+
+def iter_csv(engine, batch_size: int = EXPORT_BATCH_SIZE):
+    """CSV text chunks (header first), suitable for a StreamingResponse"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+
+    for batch in iter_export_batches(engine, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def export_csv(engine, path: str, batch_size: int = EXPORT_BATCH_SIZE):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for chunk in iter_csv(engine, batch_size):
+            f.write(chunk)
+
+
+def export_parquet(engine, path: str, batch_size: int = EXPORT_BATCH_SIZE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("progress_id", pa.string()),
+        ("enroll_no", pa.string()),
+        ("student_name", pa.string()),
+        ("class_name", pa.string()),
+        ("institute_name", pa.string()),
+        ("subject_code", pa.string()),
+        ("subject_name", pa.string()),
+        ("level", pa.int64()),
+        ("marks", pa.int64()),
+        ("attendance", pa.int64()),
+        ("payment", pa.bool_()),
+        ("rf", pa.float64()),
+    ])
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in iter_export_batches(engine, batch_size):
+            columns = list(zip(*batch))
+            arrays = [pa.array(col, type=field.type) for col, field in zip(columns, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+# -------- MAIN --------
+def main(argv=None):
+    from populate import engine
+
+    parser = argparse.ArgumentParser(description="Cohort rollups and streaming exports")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("refresh", help="Refresh cohort_rollup")
+    export_p = sub.add_parser("export", help="Export student progress")
+    export_p.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    export_p.add_argument("--out", default=None)
+    export_p.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "refresh":
+        refresh_rollups(engine)
+        return
+
+    out = args.out or f"student_progress.{args.format}"
+    if args.format == "csv":
+        export_csv(engine, out, args.batch_size)
+    else:
+        export_parquet(engine, out, args.batch_size)
+    print(f"Exported student progress to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Incremental whole-population risk scoring.
+
+Finds students whose student_progress changed since they were last scored
+(or who were scored by an older model), re-featurizes and scores only those
+in vectorized chunks, and upserts the results into student_risk. The cohort
+rollups of the classes those students belong to are refreshed afterwards.
+
+    python score_job.py                       # one run (e.g. from cron, nightly)
+    python score_job.py --interval 86400      # keep running, once a day
+    python score_job.py --full                # rescore everybody
+"""
+import argparse
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, delete, text
+
+from db import Base, StudentRisk
+from features import FEATURIZATION_VERSION, ID_COLUMN, IDS_PER_QUERY, load_student_features, risk_level_for
+from metrics import stage
+from reporting import refresh_rollups
+from train import MODEL_PATH, load_trained_model
+
+# -------- CONFIG --------
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///university.db")
+# Students featurized, scored and written per transaction
+CHUNK_SIZE = IDS_PER_QUERY
+
+# Per-level aggregates of every input featurize_progress reads (plus the
+# student's current_level, which becomes sem_no); fingerprint() hashes them
+# per student, so any change that can move a feature changes the fingerprint.
+PROGRESS_LEVELS_SQL = text("""
+    SELECT p.student_id, s.current_level, p.level,
+           COUNT(*) AS n,
+           COALESCE(SUM(p.marks), 0) AS marks,
+           COALESCE(SUM(p.attendance), 0) AS attendance,
+           SUM(CASE WHEN p.payment THEN 0 ELSE 1 END) AS unpaid
+    FROM student_progress p
+    JOIN students s ON s.id = p.student_id
+    GROUP BY p.student_id, s.current_level, p.level
+""")
+
+STUDENT_CLASSES_SQL = text(
+    "SELECT DISTINCT class_id FROM students WHERE id IN :ids AND class_id IS NOT NULL"
+).bindparams(bindparam("ids", expanding=True))
+
+# Classes of scored students whose progress rows were all removed
+ORPHANED_CLASSES_SQL = text("""
+    SELECT DISTINCT s.class_id
+    FROM student_risk r
+    JOIN students s ON s.id = r.student_id
+    WHERE s.class_id IS NOT NULL
+      AND r.student_id NOT IN (SELECT student_id FROM student_progress)
+""")
+
+
+# -------- CHANGE DETECTION --------
+def fingerprint(levels: pd.DataFrame) -> pd.DataFrame:
+    """
+    One sha1 per student over FEATURIZATION_VERSION, current_level and the
+    sorted per-level aggregates
+    """
+    levels = levels.sort_values([ID_COLUMN, "level"])
+    parts = (
+        levels["level"].astype(str) + ":" + levels["n"].astype(str) + ":"
+        + levels["marks"].astype(str) + ":" + levels["attendance"].astype(str) + ":"
+        + levels["unpaid"].astype(str)
+    )
+    grouped = parts.groupby(levels[ID_COLUMN], sort=False)
+    current_level = levels.groupby(ID_COLUMN, sort=False)["current_level"].first().astype(str)
+    raw = f"v{FEATURIZATION_VERSION}|" + current_level + "|" + grouped.agg("|".join)
+    return pd.DataFrame({
+        ID_COLUMN: raw.index,
+        "fingerprint": [hashlib.sha1(v.encode("utf-8")).hexdigest() for v in raw],
+    })
+
+
+def find_stale_students(conn, model_version: str, full: bool = False) -> pd.DataFrame:
+    """Students (with fingerprints) that need scoring by model_version"""
+    with stage("score_job", "detect"):
+        current = fingerprint(pd.read_sql(PROGRESS_LEVELS_SQL, conn))
+        if full:
+            return current
+
+        scored = pd.read_sql(
+            text("SELECT student_id, progress_fingerprint, model_version FROM student_risk"), conn
+        )
+        merged = current.merge(scored, on=ID_COLUMN, how="left")
+        stale = (
+            merged["progress_fingerprint"].isna()
+            | (merged["progress_fingerprint"] != merged["fingerprint"])
+            | (merged["model_version"] != model_version)
+        )
+        return merged.loc[stale, [ID_COLUMN, "fingerprint"]]
+
+
+def touched_classes(conn, student_ids) -> set:
+    student_ids = list(student_ids)
+    classes = set()
+    for i in range(0, len(student_ids), IDS_PER_QUERY):
+        chunk = student_ids[i:i + IDS_PER_QUERY]
+        classes.update(r.class_id for r in conn.execute(STUDENT_CLASSES_SQL, {"ids": chunk}))
+    return classes
+
+
+# -------- SCORING --------
+def score_chunk(conn, model, model_version: str, chunk: pd.DataFrame, scored_at: datetime) -> int:
+    ids = chunk[ID_COLUMN].tolist()
+
+    with stage("score_job", "featurize"):
+        features = load_student_features(conn, ids)
+
+    with stage("score_job", "predict"):
+        probabilities = model.predict_proba(features.to_numpy())[:, 1]
+
+    fingerprints = chunk.set_index(ID_COLUMN)["fingerprint"]
+    rows = [
+        {
+            "student_id": student_id,
+            "dropout_probability": round(float(p), 4),
+            "risk_level": risk_level_for(float(p)),
+            "model_version": model_version,
+            "scored_at": scored_at,
+            "progress_fingerprint": fingerprints[student_id],
+        }
+        for student_id, p in zip(features.index, probabilities)
+    ]
+
+    with stage("score_job", "write"):
+        conn.execute(delete(StudentRisk.__table__).where(StudentRisk.__table__.c.student_id.in_(ids)))
+        if rows:
+            conn.execute(StudentRisk.__table__.insert(), rows)
+
+    return len(rows)
+
+
+def run_scoring(engine, model_path: str = MODEL_PATH, chunk_size: int = CHUNK_SIZE, full: bool = False,
+                rollups: bool = True) -> dict:
+    model, meta = load_trained_model(model_path)
+    model_version = meta["model_version"]
+    Base.metadata.create_all(engine, tables=[StudentRisk.__table__])
+
+    start = time.perf_counter()
+    scored_at = datetime.now(timezone.utc)
+
+    with engine.begin() as conn:
+        touched = {r.class_id for r in conn.execute(ORPHANED_CLASSES_SQL)}
+        # Students whose progress rows were all removed keep no stale score
+        conn.execute(text(
+            "DELETE FROM student_risk WHERE student_id NOT IN (SELECT student_id FROM student_progress)"
+        ))
+        stale = find_stale_students(conn, model_version, full=full)
+
+    print(f"{len(stale)} students to score with model {model_version}")
+
+    scored = 0
+    for offset in range(0, len(stale), chunk_size):
+        chunk = stale.iloc[offset:offset + chunk_size]
+        # One transaction per chunk: a crash loses at most one chunk of work
+        with engine.begin() as conn:
+            scored += score_chunk(conn, model, model_version, chunk, scored_at)
+            touched |= touched_classes(conn, chunk[ID_COLUMN])
+        print(f"  scored {scored}/{len(stale)}")
+
+    elapsed = round(time.perf_counter() - start, 3)
+    print(f"Scoring finished: {scored} students in {elapsed:.1f}s")
+
+    # Only the classes of changed students are re-aggregated; rf-only edits and
+    # class moves are picked up by a full `python reporting.py refresh`
+    if rollups and touched:
+        refresh_rollups(engine, class_ids=sorted(touched))
+
+    return {"model_version": model_version, "stale": len(stale), "scored": scored, "seconds": elapsed}
+
+
+# -------- MAIN --------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally score dropout risk for all students")
+    parser.add_argument("--db", default=DATABASE_URL)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--full", action="store_true", help="Rescore every student")
+    parser.add_argument("--no-rollups", action="store_true",
+                        help="Do not refresh the cohort rollups of the classes that changed")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="Seconds between runs; omit to run once (e.g. from cron)")
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.db)
+    while True:
+        run_scoring(engine, args.model, chunk_size=args.chunk_size, full=args.full,
+                    rollups=not args.no_rollups)
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()